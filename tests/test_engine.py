@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from trading_engine import engine as engine_module
+from trading_engine.engine import TradingEngine
+from trading_engine.models import TradeConfig
+from trading_engine.orders import OrderManager
+from trading_engine.recorder import EventRecorder
+from trading_engine.scheduler import AdaptiveScheduler
+
+from .test_orders import CONFIG, StubExchange
+
+
+class MonitorStub(StubExchange):
+    """Exchange for one monitor tick: the position check stops the engine without a trade exit."""
+
+    has = {'fetchCanceledAndClosedOrders': True}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.finished_fetches = 0
+        self.engine = None
+
+    async def fetch_canceled_and_closed_orders(self, symbol, since=None, limit=None, params=None):
+        self.finished_fetches += 1
+        return self.closed_orders
+
+    async def fetch_positions(self, symbols):
+        self.engine.running = False
+        raise RuntimeError('end of tick')
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    async def _sleep(seconds):
+        pass
+    monkeypatch.setattr(engine_module, 'safe_sleep', _sleep)
+
+
+def make_engine(exchange, tmp_path):
+    engine = TradingEngine.__new__(TradingEngine)
+    engine.config = TradeConfig.from_dict(CONFIG)
+    engine.running = False
+    engine.exchange_connector = SimpleNamespace(exchange=exchange)
+    engine.recorder = EventRecorder(path=str(tmp_path))
+    engine.order_manager = OrderManager(exchange, engine.config, deal_id='d1', recorder=engine.recorder)
+    engine.scheduler = AdaptiveScheduler()
+    exchange.engine = engine
+    return engine
+
+
+def test_finished_orders_not_fetched_while_everything_is_open(tmp_path):
+    exchange = MonitorStub('bybit')
+    engine = make_engine(exchange, tmp_path)
+    engine.order_manager.grid_order_ids.append('d1-grid-0')
+    engine.order_manager.index.record('d1-grid-0', '1')
+    exchange.open_orders = [{'id': '1', 'clientOrderId': 'd1-grid-0'}]
+    asyncio.run(engine.monitor_loop())
+    assert exchange.finished_fetches == 0
+    assert engine.order_manager.grid_order_ids == ['d1-grid-0']
+
+
+def test_cancelled_and_unmatched_intents_stop_being_tracked(tmp_path):
+    exchange = MonitorStub('bybit')
+    engine = make_engine(exchange, tmp_path)
+    om = engine.order_manager
+    om.max_unmatched_ticks = 1
+    for cid in ('d1-grid-0', 'd1-grid-1'):
+        om.grid_order_ids.append(cid)
+        om.index.record(cid)
+    exchange.closed_orders = [{'id': '1', 'clientOrderId': 'd1-grid-0', 'status': 'canceled'}]
+    asyncio.run(engine.monitor_loop())
+    assert exchange.finished_fetches == 1
+    assert om.grid_order_ids == []
@@ -0,0 +1,200 @@
+import asyncio
+import time
+
+import ccxt.async_support as ccxt
+import pytest
+
+from trading_engine import orders as orders_module
+from trading_engine.models import TradeConfig
+from trading_engine.orders import OrderIndex, OrderManager, make_client_order_id, parse_client_order_id
+
+CONFIG = {
+    "account": "Bybit/Testnet",
+    "symbol": "BTC/USDT:USDT",
+    "side": "short",
+    "market_order_amount": 100,
+    "stop_loss_percent": 7,
+    "trailing_sl_offset_percent": 3,
+    "limit_orders_amount": 200,
+    "leverage": 10,
+    "move_sl_to_breakeven": True,
+    "tp_orders": [{"price_percent": 1.0, "quantity_percent": 100.0}],
+    "limit_orders": {"range_percent": 5.0, "orders_count": 2, "engine_deal_duration_minutes": 10},
+}
+
+
+class StubExchange:
+    """Scripted exchange: each create_order call pops the next outcome (order dict or exception)."""
+
+    def __init__(self, exchange_id='bybit', outcomes=()):
+        self.id = exchange_id
+        self.outcomes = list(outcomes)
+        self.sent = []
+        self.cancelled = []
+        self.open_orders = []
+        self.closed_orders = []
+
+    def market(self, symbol):
+        return {'contractSize': 1}
+
+    async def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self.sent.append(params['clientOrderId'])
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def fetch_ticker(self, symbol):
+        return {'last': 100.0, 'timestamp': 1_000_000}
+
+    async def cancel_order(self, id, symbol, params=None):
+        self.cancelled.append((id, params))
+
+    async def fetch_open_orders(self, symbol, since=None, limit=None, params=None):
+        return self.open_orders
+
+    async def fetch_closed_orders(self, symbol, since=None, limit=None, params=None):
+        return self.closed_orders
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    async def _sleep(seconds):
+        pass
+    monkeypatch.setattr(orders_module, 'safe_sleep', _sleep)
+
+
+def make_manager(exchange):
+    return OrderManager(exchange, TradeConfig.from_dict(CONFIG), deal_id='d1')
+
+
+def test_client_order_id_roundtrip():
+    cid = make_client_order_id('d1', 'tp2', 3)
+    assert cid == 'd1-tp2-3'
+    assert parse_client_order_id(cid) == ('d1', 'tp2', 3)
+
+
+def test_reconcile_fills_missing_exchange_id():
+    index = OrderIndex()
+    index.record('d1-grid-0')
+    matched = index.reconcile([{'id': '42', 'clientOrderId': 'd1-grid-0'}, {'id': '7', 'clientOrderId': 'other'}])
+    assert list(matched) == ['d1-grid-0']
+    assert index.exchange_id('d1-grid-0') == '42'
+    assert index.client_id('42') == 'd1-grid-0'
+
+
+def test_reconcile_strips_gate_prefix():
+    index = OrderIndex()
+    index.record('d1-tp1-0')
+    matched = index.reconcile([{'id': '9', 'clientOrderId': 't-d1-tp1-0'}])
+    assert 'd1-tp1-0' in matched
+    assert index.exchange_id('d1-tp1-0') == '9'
+
+
+def test_reconcile_matches_by_exchange_id_without_client_id():
+    index = OrderIndex()
+    index.record('d1-sl-1', '5')
+    assert 'd1-sl-1' in index.reconcile([{'id': '5', 'clientOrderId': None}])
+
+
+def test_timeout_then_duplicate_returns_synthetic_order():
+    exchange = StubExchange('bybit', [ccxt.RequestTimeout('timeout'), ccxt.InvalidOrder('OrderLinkedID is duplicate')])
+    manager = make_manager(exchange)
+    order = asyncio.run(manager._create_order('d1-grid-0', 'BTC/USDT:USDT', 'limit', 'sell', 1.0, 100.0))
+    assert order['id'] is None and order['clientOrderId'] == 'd1-grid-0'
+    assert exchange.sent == ['d1-grid-0', 'd1-grid-0']
+    assert 'd1-grid-0' in manager.index
+
+
+def test_timeout_on_gate_finds_landed_order_instead_of_resending():
+    exchange = StubExchange('gate', [ccxt.RequestTimeout('timeout')])
+    exchange.open_orders = [{'id': '77', 'clientOrderId': 't-d1-grid-0'}]
+    manager = make_manager(exchange)
+    order = asyncio.run(manager._create_order('d1-grid-0', 'BTC/USDT:USDT', 'limit', 'sell', 1.0, 100.0))
+    assert order['id'] == '77'
+    assert exchange.sent == ['d1-grid-0']
+    assert manager.index.exchange_id('d1-grid-0') == '77'
+
+
+def test_unknown_outcome_stays_tracked_and_rejection_is_dropped():
+    exchange = StubExchange('bybit', [ccxt.RequestTimeout('timeout')] * 3 + [ccxt.InvalidOrder('bad qty')])
+    manager = make_manager(exchange)
+    asyncio.run(manager.build_limit_grid(100.0))
+    assert manager.grid_order_ids == ['d1-grid-0']
+    assert 'd1-grid-0' in manager.index and 'd1-grid-1' not in manager.index
+
+
+def test_rate_limit_is_retried_without_lookup_and_dropped_after_last_attempt():
+    exchange = StubExchange('gateio', [ccxt.RateLimitExceeded('slow down')] * 3 + [{'id': '1'}])
+    exchange.open_orders = None  # a lookup would blow up
+    manager = make_manager(exchange)
+    asyncio.run(manager.build_limit_grid(100.0))
+    assert exchange.sent == ['d1-grid-0'] * 3 + ['d1-grid-1']
+    assert manager.grid_order_ids == ['d1-grid-1']
+    assert 'd1-grid-0' not in manager.index
+
+
+def test_no_tp_placed_once_every_level_filled():
+    exchange = StubExchange('bybit')
+    manager = make_manager(exchange)
+    manager.order_amount = 0
+    assert asyncio.run(manager.place_tp_orders({'entry_price': 100.0, 'size': 1.0})) == []
+    assert exchange.sent == []
+
+
+@pytest.mark.parametrize('exchange_id, expected_id, expected_params', [
+    ('bybit', None, {'orderLinkId': 'd1-tp1-0'}),
+    ('gate', 't-d1-tp1-0', {}),
+    ('gateio', 't-d1-tp1-0', {}),
+])
+def test_cancel_without_exchange_id_uses_client_id(exchange_id, expected_id, expected_params):
+    exchange = StubExchange(exchange_id)
+    manager = make_manager(exchange)
+    manager.index.record('d1-tp1-0')
+    asyncio.run(manager._cancel_order('d1-tp1-0', 'BTC/USDT:USDT'))
+    assert exchange.cancelled == [(expected_id, expected_params)]
+    assert 'd1-tp1-0' not in manager.index
+
+
+def test_unchanged_stop_loss_is_not_replaced():
+    exchange = StubExchange('bybit', [{'id': '1'}, {'id': '2'}])
+    manager = make_manager(exchange)
+    position = {'entry_price': 100.0, 'size': 1.0}
+    asyncio.run(manager.update_stop_loss(position))
+    manager.open_client_ids = {'d1-sl-1'}
+    asyncio.run(manager.update_stop_loss(position))
+    assert exchange.sent == ['d1-sl-1'] and exchange.cancelled == []
+    asyncio.run(manager.update_stop_loss({'entry_price': 100.0, 'size': 2.0}))
+    assert exchange.sent == ['d1-sl-1', 'd1-sl-2'] and len(exchange.cancelled) == 1
+
+
+def test_stop_loss_that_timed_out_is_resent_next_tick():
+    exchange = StubExchange('bybit', [ccxt.RequestTimeout('timeout')] * 3 + [{'id': '2'}])
+    manager = make_manager(exchange)
+    position = {'entry_price': 100.0, 'size': 1.0}
+    asyncio.run(manager.update_stop_loss(position))
+    assert exchange.sent == ['d1-sl-1'] * 3
+    # next tick: the snapshot shows it never landed
+    manager.open_client_ids = set()
+    asyncio.run(manager.update_stop_loss(position))
+    assert exchange.sent == ['d1-sl-1'] * 3 + ['d1-sl-2']
+    assert manager.current_sl_order_id == 'd1-sl-2' and manager.live_sl == (107.0, 1.0)
+
+
+def test_stop_loss_that_timed_out_but_landed_is_kept():
+    exchange = StubExchange('bybit', [ccxt.RequestTimeout('timeout')] * 3)
+    manager = make_manager(exchange)
+    position = {'entry_price': 100.0, 'size': 1.0}
+    asyncio.run(manager.update_stop_loss(position))
+    manager.open_client_ids = {'d1-sl-1'}
+    asyncio.run(manager.update_stop_loss(position))
+    asyncio.run(manager.update_stop_loss(position))
+    assert exchange.sent == ['d1-sl-1'] * 3 and exchange.cancelled == []
+
+
+def test_price_sample_uses_local_monotonic_clock():
+    manager = make_manager(StubExchange('bybit', [{'id': '1'}]))
+    before = time.monotonic()
+    asyncio.run(manager.update_stop_loss({'entry_price': 100.0, 'size': 1.0}))
+    assert manager.last_price == 100.0
+    assert before <= manager.last_price_ts <= time.monotonic()
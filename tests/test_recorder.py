@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from trading_engine.recorder import EventRecorder
+
+pytest.importorskip('pyarrow')
+
+
+def record_deal(recorder, deal_id='d1'):
+    recorder.record('order_sent', deal_id, client_order_id=f'{deal_id}-mkt-0', ladder='mkt', level=0,
+                    side='sell', price=100.0, local_ts=1000)
+    recorder.record('order_ack', deal_id, client_order_id=f'{deal_id}-mkt-0', exchange_order_id='1',
+                    local_ts=1050)
+    recorder.record('fill', deal_id, client_order_id=f'{deal_id}-mkt-0', price=99.9, amount=1.0, local_ts=1100)
+    recorder.record('sl_move', deal_id, client_order_id=f'{deal_id}-sl-1', price=107.0, local_ts=1200)
+    recorder.record('exit', deal_id, info='TP', local_ts=2000)
+
+
+def test_report_from_flushed_and_buffered_events(tmp_path):
+    recorder = EventRecorder(path=str(tmp_path), batch_size=1000)
+    record_deal(recorder)
+    recorder.flush()
+    record_deal(recorder, 'd2')
+    assert recorder.deals() == ['d1', 'd2']
+    for deal_id in ('d1', 'd2'):
+        report = recorder.deal_report(deal_id)
+        order = report['orders'][0]
+        assert order['ack_latency_ms'] == 50
+        # a short filled 0.1% below the market reference is adverse
+        assert order['slippage_bps'] == pytest.approx(10.0)
+        assert report['sl_moves'] == 1 and report['exit_reason'] == 'TP'
+
+
+def test_full_batch_is_written_off_the_event_loop(tmp_path):
+    async def run():
+        recorder = EventRecorder(path=str(tmp_path), batch_size=5)
+        record_deal(recorder)
+        assert recorder._pending
+        await recorder.close()
+        return recorder
+
+    recorder = asyncio.run(run())
+    assert len(recorder.events('d1')) == 5
+    assert list((tmp_path / 'deal_id=d1').glob('.*')) == []
+
+
+def test_flush_if_due_writes_a_partial_batch(tmp_path):
+    async def run():
+        recorder = EventRecorder(path=str(tmp_path), batch_size=500, flush_interval=0.0)
+        record_deal(recorder)
+        recorder.flush_if_due()
+        await asyncio.gather(*recorder._pending)
+
+    asyncio.run(run())
+    assert len(list((tmp_path / 'deal_id=d1').glob('part-*.parquet'))) == 1
@@ -0,0 +1,36 @@
+import pytest
+
+from trading_engine.models import MonitorConfig
+from trading_engine.scheduler import AdaptiveScheduler
+
+
+def make_scheduler():
+    scheduler = AdaptiveScheduler(min_interval=1.0, max_interval=15.0, default_interval=5.0)
+    for i, price in enumerate([100.0, 100.02, 99.99, 100.01, 100.0]):
+        scheduler.observe(price, ts=i * 2.0)
+    return scheduler
+
+
+def test_interval_shrinks_near_trigger_and_grows_far_from_it():
+    scheduler = make_scheduler()
+    near = scheduler.next_interval(100.0, [100.01])
+    far = scheduler.next_interval(100.0, [105.0])
+    assert near == 1.0
+    assert far == 15.0
+    assert scheduler.metrics()['poll_interval'] == far
+
+
+def test_default_interval_without_price():
+    assert make_scheduler().next_interval(None, [101.0]) == 5.0
+
+
+def test_stale_sample_is_ignored():
+    scheduler = make_scheduler()
+    sigma = scheduler.volatility()
+    scheduler.observe(100.0, ts=8.0)
+    assert scheduler.volatility() == sigma
+
+
+def test_monitor_config_rejects_inverted_bounds():
+    with pytest.raises(ValueError):
+        MonitorConfig(min_poll_interval=10.0, max_poll_interval=2.0)
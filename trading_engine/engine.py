@@ -2,10 +2,14 @@ import asyncio
 import signal
 import sys
 
+import ccxt.async_support as ccxt
+
 from .exchange import ExchangeConnector
 from .utility import logger, safe_sleep
 from .models import TradeConfig
-from .orders import OrderManager
+from .orders import OrderManager, GATE_IDS
+from .recorder import EventRecorder
+from .scheduler import AdaptiveScheduler
 from .rest_api.app import create_app
 
 try:
@@ -25,7 +29,14 @@ class TradingEngine:
         self.running = False
         self._server = None
         self.exchange_connector = ExchangeConnector(config, api_key, api_secret)
-        self.order_manager = OrderManager(exchange=self.exchange_connector.exchange, config=self.config)
+        self.recorder = EventRecorder(path=self.config.events_path)
+        self.order_manager = OrderManager(exchange=self.exchange_connector.exchange, config=self.config,
+                                          recorder=self.recorder)
+        self.scheduler = AdaptiveScheduler(
+            min_interval=self.config.monitor.min_poll_interval,
+            max_interval=self.config.monitor.max_poll_interval,
+            window=self.config.monitor.volatility_window,
+        )
 
     async def run(self):
         await self.exchange_connector.connect()
@@ -49,6 +60,7 @@ class TradingEngine:
         if not self.order_manager.position:
             logger.error('No position found; aborting')
             return
+        self.order_manager.record_entry_fill(market_ord, self.order_manager.position)
         # Place SL orders according to config
         await self.order_manager.update_stop_loss(self.order_manager.position)
         # Place TP orders based on average
@@ -80,6 +92,8 @@ class TradingEngine:
     async def _on_trade_exit(self, reason: str = "TP/SL"):
         """Cleanup when a trade is completed (TP or SL hit)."""
         logger.info(f"Trade exit triggered due to {reason}")
+        self.recorder.record('exit', self.order_manager.deal_id, info=reason)
+        self.recorder.flush_in_background()
 
         try:
 
@@ -95,65 +109,90 @@ class TradingEngine:
 
         self.order_manager.tp_order_ids.clear()
         self.order_manager.grid_order_ids.clear()
+        self.order_manager.index.clear()
+        self.order_manager.order_prices.clear()
 
         self.running = False
         logger.info("Trading engine stopped after exit.")
 
     async def monitor_loop(self, poll_interval: float = 5.0):
         """Main monitor loop: polls orders/positions and reacts when grid orders fill.
+        The poll period adapts to the distance to the nearest grid/TP/SL price (see AdaptiveScheduler);
+        poll_interval is used until enough price samples exist to estimate volatility.
         """
         logger.info('Starting monitor loop')
+        self.scheduler.default_interval = poll_interval
         self.running = True
         try:
             while self.running:
-                # refresh open orders
+                # only a ticker fetched during this tick counts as a new price sample
+                self.order_manager.last_price = None
+                self.order_manager.last_price_ts = None
+                # refresh open orders and match them to our client order ids
+                om = self.order_manager
+                snapshot = False
+                open_by_client, finished_by_client = {}, {}
+                om.open_client_ids = None
                 try:
-                    orders = await self.exchange_connector.exchange.fetch_open_orders(self.config.symbol)
-                    open_ids = {o['id']: o for o in orders}
-                except Exception:
-                    open_ids = {}
-                # logger.info(f"open_ids: {open_ids}")
-                # detect executed grid orders by checking known grid ids against open orders
+                    exchange = self.exchange_connector.exchange
+                    open_orders = await exchange.fetch_open_orders(self.config.symbol)
+                    open_by_client = om.index.reconcile(open_orders)
+                    open_client_ids = set(open_by_client)
+                    if om.current_sl_order_id and exchange.id in GATE_IDS:
+                        # Gate lists trigger (stop) orders separately
+                        stops = await exchange.fetch_open_orders(self.config.symbol, params={'stop': True})
+                        open_client_ids.update(om.index.reconcile(stops))
+                    om.open_client_ids = open_client_ids
+                    tracked = list(om.grid_order_ids) + list(om.tp_order_ids)
+                    # finished orders are only needed when something tracked has left the book
+                    if any(cid not in open_by_client for cid in tracked):
+                        finished_by_client = om.index.reconcile(await self._fetch_finished_orders())
+                    snapshot = True
+                except ccxt.NetworkError as e:
+                    logger.warning('Could not fetch orders: %s', e)
+                except Exception as e:
+                    logger.exception('Order reconciliation failed: %s', e)
+                # detect executed grid orders by checking known grid ids against open/finished orders
                 executed_grid = []
-
-                for gid in list(self.order_manager.grid_order_ids):
-                    if gid not in open_ids:
-                        # order no longer open -> likely filled or cancelled. Fetch order to check
-                        try:
-                            completed = await self.exchange_connector.exchange.fetch_order(gid, self.config.symbol)
-                            status = completed.get('status')
-                            if status in ('closed', 'filled', 'canceled'):
-                                logger.info('Grid order %s status %s', gid, status)
-                                if status in ('closed', 'filled'):
-                                    executed_grid.append(gid)
-                                try:
-                                    self.order_manager.grid_order_ids.remove(gid)
-                                except ValueError:
-                                    pass
-                        except Exception:
-                            # cannot fetch specific order; assume executed
-                            executed_grid.append(gid)
-                existing = True
+                # without a snapshot we can't tell anything; skip the check this tick
+                if snapshot:
+                    for cid in list(om.grid_order_ids) + list(om.tp_order_ids):
+                        if cid in open_by_client:
+                            om.unmatched_ticks.pop(cid, None)
+                            continue
+                        completed = finished_by_client.get(cid)
+                        if completed is None:
+                            # not visible on the exchange (e.g. never landed); give up after a few ticks
+                            om.unmatched_ticks[cid] = om.unmatched_ticks.get(cid, 0) + 1
+                            if om.unmatched_ticks[cid] >= om.max_unmatched_ticks:
+                                logger.warning('Order %s not found on the exchange; no longer tracking it', cid)
+                                om.forget(cid)
+                            continue
+                        status = completed.get('status')
+                        if status not in ('closed', 'filled', 'canceled'):
+                            continue
+                        logger.info('Order %s (%s) status %s', cid, completed.get('id'), status)
+                        if status in ('closed', 'filled'):
+                            om.record_fill(cid, completed)
+                            if cid in om.grid_order_ids:
+                                executed_grid.append(cid)
+                            else:
+                                # filled TPs are no longer live triggers; the next replacement skips their level
+                                om.order_amount -= 1
+                        om.forget(cid)
+                    sl_id = om.current_sl_order_id
+                    completed = finished_by_client.get(sl_id)
+                    if completed is not None and completed.get('status') in ('closed', 'filled'):
+                        om.record_fill(sl_id, completed)
                 if executed_grid:
                     # recompute average and replace TP orders
                     logger.info('Detected executed grid orders: %s', executed_grid)
-                    pos = await self.order_manager.compute_average_entry()
+                    pos = await om.compute_average_entry()
                     if pos:
-                        tps = await self.order_manager.place_tp_orders(pos)
-                        existing = False
-                        if tps:
-                            logger.info('All TP orders placed successfully')
-                            existing = True
-                # for tid in list(self.order_manager.tp_order_ids):
-                #     if tid in open_ids:
-                #         existing = True
-                if not existing:
-                    try:
-                        logger.info('TPs are filled; trade complete')
-                        await self._on_trade_exit("TP")
-                        return
-                    except Exception:
-                        pass
+                        await om.place_tp_orders(pos)
+                        if not om.tp_order_ids:
+                            # nothing live or pending; the position check below decides whether the deal is over
+                            logger.warning('No TP orders tracked after replacement')
 
                 # Check position instead of stop order ID
                 try:
@@ -176,15 +215,29 @@ class TradingEngine:
                 except Exception as e:
                     logger.warning(f"Error during position check: {e}")
 
-                await safe_sleep(poll_interval)
+                self.recorder.flush_if_due()
+
+                price = self.order_manager.last_price
+                self.scheduler.observe(price, self.order_manager.last_price_ts)
+                interval = self.scheduler.next_interval(price, self.order_manager.trigger_prices())
+                logger.debug('Next poll in %.2fs (distance %s)', interval, self.scheduler.last_distance)
+                await safe_sleep(interval)
         except asyncio.CancelledError:
             logger.info('Monitor loop cancelled')
         finally:
             logger.info('Monitor loop ended')
 
+    async def _fetch_finished_orders(self):
+        """Recent filled and cancelled orders (Bybit's fetch_closed_orders returns only filled ones)."""
+        exchange = self.exchange_connector.exchange
+        if exchange.has.get('fetchCanceledAndClosedOrders'):
+            return await exchange.fetch_canceled_and_closed_orders(self.config.symbol, limit=50)
+        return await exchange.fetch_closed_orders(self.config.symbol, limit=50)
+
     async def shutdown(self):
         logger.info("Shutting down TradingEngine...")
         self.running = False
+        await self.recorder.close()
         try:
             if hasattr(self, "exchange_connector") and self.exchange_connector.exchange:
                 await self.exchange_connector.exchange.close()
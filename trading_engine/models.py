@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Dict
 
 @dataclass
@@ -12,6 +12,17 @@ class LimitGridConfig:
     orders_count: int
     engine_deal_duration_minutes: int
 
+@dataclass
+class MonitorConfig:
+    min_poll_interval: float = 1.0
+    max_poll_interval: float = 15.0
+    volatility_window: int = 30
+
+    def __post_init__(self):
+        if not 0 < self.min_poll_interval <= self.max_poll_interval:
+            raise ValueError(f"monitor: need 0 < min_poll_interval <= max_poll_interval, "
+                             f"got {self.min_poll_interval} and {self.max_poll_interval}")
+
 @dataclass
 class TradeConfig:
     account: str
@@ -25,12 +36,15 @@ class TradeConfig:
     move_sl_to_breakeven: bool
     tp_orders: List[TPOrderConfig]
     limit_orders: LimitGridConfig
+    events_path: str = 'events'
+    monitor: MonitorConfig = field(default_factory=MonitorConfig)
 
     @staticmethod
     def from_dict(d: Dict):
         """Convert dict from JSON into TradeConfig instance"""
         tp_orders = [TPOrderConfig(**t) for t in d.get('tp_orders', [])]
         limit_orders = LimitGridConfig(**d.get('limit_orders', {}))
+        monitor = MonitorConfig(**d.get('monitor', {}))
         return TradeConfig(
             account=d['account'],
             symbol=d['symbol'],
@@ -43,6 +57,8 @@ class TradeConfig:
             move_sl_to_breakeven=d['move_sl_to_breakeven'],
             tp_orders=tp_orders,
             limit_orders=limit_orders,
+            events_path=d.get('events_path', 'events'),
+            monitor=monitor,
         )
 
     #масив діктів в tp orders
@@ -1,12 +1,103 @@
+import time
+import uuid
+
+import ccxt.async_support as ccxt
+
 from trading_engine.utility import logger, safe_sleep
 
 
+# exchanges that reject a reused client order id, so resending after a timeout can't duplicate
+IDEMPOTENT_CLIENT_IDS = ('bybit',)
+# ccxt.gateio reports id 'gateio', ccxt.gate reports 'gate'
+GATE_IDS = ('gate', 'gateio')
+
+
+def make_client_order_id(deal_id: str, ladder: str, level: int) -> str:
+    """Deterministic client order id for one order intent (kept short for Gate's 28 byte limit)."""
+    return f"{deal_id}-{ladder}-{level}"
+
+
+def parse_client_order_id(client_id: str):
+    """Inverse of make_client_order_id: returns (deal_id, ladder, level)."""
+    deal_id, ladder, level = client_id.rsplit('-', 2)
+    return deal_id, ladder, int(level)
+
+
+class OrderIndex:
+    """In-memory client order id <-> exchange order id index."""
+
+    def __init__(self):
+        self._by_client = {}
+        self._by_exchange = {}
+
+    def __contains__(self, client_id):
+        return client_id in self._by_client
+
+    def record(self, client_id: str, exchange_id=None):
+        """Register an order intent; exchange_id stays None until the exchange acks it."""
+        self._by_client[client_id] = exchange_id
+        if exchange_id is not None:
+            self._by_exchange[exchange_id] = client_id
+
+    def exchange_id(self, client_id: str):
+        return self._by_client.get(client_id)
+
+    def client_id(self, exchange_id: str):
+        return self._by_exchange.get(exchange_id)
+
+    def discard(self, client_id: str):
+        exchange_id = self._by_client.pop(client_id, None)
+        if exchange_id is not None:
+            self._by_exchange.pop(exchange_id, None)
+
+    def clear(self):
+        self._by_client.clear()
+        self._by_exchange.clear()
+
+    def reconcile(self, orders) -> dict:
+        """Match exchange orders to known intents and fill in missing exchange ids.
+        Returns {client_id: order} for every order that belongs to this index.
+        """
+        matched = {}
+        for o in orders:
+            cid = o.get('clientOrderId') or self._by_exchange.get(o.get('id'))
+            if not cid:
+                continue
+            # Gate echoes the client id back with its mandatory 't-' prefix
+            if cid not in self._by_client and cid.startswith('t-'):
+                cid = cid[2:]
+            if cid not in self._by_client:
+                continue
+            if self._by_client[cid] is None and o.get('id'):
+                self.record(cid, o['id'])
+            matched[cid] = o
+        return matched
+
+
 class OrderManager:
     """Responsible for placing/canceling market, grid, TP orders."""
 
-    def __init__(self, exchange, config):
+    def __init__(self, exchange, config, deal_id: str = None, max_retries: int = 3, recorder=None):
         self.exchange = exchange
         self.config = config
+        self.recorder = recorder
+        self.deal_id = deal_id or uuid.uuid4().hex[:8]
+        self.max_retries = max_retries
+        self.index = OrderIndex()
+        self.tp_revision = 0
+        self.sl_revision = 0
+        self.order_prices = {}
+        self.last_price = None
+        self.last_price_ts = None
+        # (price, size) of the SL known to be on the exchange / of one whose create timed out
+        self.live_sl = None
+        self.unconfirmed_sl = None
+        # client ids open in this tick's snapshot (incl. stop orders); None when the snapshot failed
+        self.open_client_ids = None
+        self.recorded_fills = set()
+        # ticks a tracked intent has been seen neither open nor finished on the exchange
+        self.unmatched_ticks = {}
+        self.max_unmatched_ticks = 5
         self.tp_orders = []
         self.grid_orders = []
         self.grid_order_ids = []
@@ -17,6 +108,142 @@ class OrderManager:
         self.last_sl_price = None
         self.order_amount = len(self.config.tp_orders)
 
+    def _record(self, kind: str, client_id: str = None, **fields):
+        if self.recorder is None:
+            return
+        if client_id:
+            _, ladder, level = parse_client_order_id(client_id)
+            fields.update(client_order_id=client_id, ladder=ladder, level=level)
+        self.recorder.record(kind, self.deal_id, **fields)
+
+    def record_fill(self, client_id: str, order: dict):
+        """Record a fill from a ccxt order structure (average price, filled amount, exchange time).
+        Each client id is recorded once, however many reconciliations see it closed.
+        """
+        if client_id in self.recorded_fills:
+            return
+        self.recorded_fills.add(client_id)
+        self._record(
+            'fill', client_id,
+            exchange_order_id=order.get('id'),
+            side=order.get('side'),
+            price=float(order.get('average') or order.get('price') or 0) or None,
+            amount=float(order.get('filled') or order.get('amount') or 0),
+            exchange_ts=order.get('lastTradeTimestamp') or order.get('timestamp'),
+        )
+
+    def _acked(self, client_id: str, order: dict, side, price):
+        self.index.record(client_id, order.get('id'))
+        if price is not None:
+            self.order_prices[client_id] = price
+        self._record('order_ack', client_id, exchange_order_id=order.get('id'), side=side,
+                     exchange_ts=order.get('timestamp'))
+
+    async def _create_order(self, client_id: str, symbol: str, otype, side, amount, price=None, params=None,
+                            ref_price=None):
+        """Create an order tagged with client_id, retrying network errors/timeouts with the same id.
+        On Bybit a retry that already landed is rejected as a duplicate: the returned order has
+        id None and the exchange id is filled in by the next open-orders reconciliation.
+        Other exchanges (Gate's `text`) don't enforce unique client ids, so the order is looked up
+        by client id before resending.
+        If the last attempt fails with NetworkError the outcome is unknown: the intent stays indexed
+        and the caller should keep tracking client_id. On any other failure (including rate limits,
+        which the exchange never processed) the intent is dropped from the index.
+        ref_price is the intended price recorded for market orders (used for slippage reports).
+        """
+        params = dict(params or {}, clientOrderId=client_id)
+        self.index.record(client_id)
+        self._record('order_sent', client_id, side=side, amount=amount,
+                     price=price if price is not None else ref_price, info=otype)
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                order = await self.exchange.create_order(symbol, otype, side, amount, price, params)
+            except ccxt.InvalidOrder as e:
+                if attempt > 1 and (isinstance(e, ccxt.DuplicateOrderId) or 'duplicate' in str(e).lower()):
+                    logger.info('Order %s already accepted by exchange on previous attempt', client_id)
+                    if price is not None:
+                        self.order_prices[client_id] = price
+                    return {'id': None, 'clientOrderId': client_id, 'symbol': symbol, 'side': side,
+                            'amount': amount, 'price': price}
+                self.index.discard(client_id)
+                raise
+            except (ccxt.RateLimitExceeded, ccxt.DDoSProtection) as e:
+                # rejected before processing: safe to resend without a lookup
+                if attempt == self.max_retries:
+                    self.index.discard(client_id)
+                    raise
+                logger.warning('Order %s attempt %d rate limited (%s); retrying', client_id, attempt, e)
+                await safe_sleep(1.0 * attempt)
+                continue
+            except ccxt.NetworkError as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning('Order %s attempt %d failed (%s); retrying', client_id, attempt, e)
+                await safe_sleep(0.5 * attempt)
+                if self.exchange.id not in IDEMPOTENT_CLIENT_IDS:
+                    try:
+                        landed = await self._find_order(client_id, symbol, params)
+                    except Exception as lookup_error:
+                        # can't tell whether it landed; resending could duplicate it
+                        logger.warning('Lookup of order %s failed: %s', client_id, lookup_error)
+                        raise e
+                    if landed is not None:
+                        logger.info('Order %s already accepted by exchange on previous attempt', client_id)
+                        self._acked(client_id, landed, side, price)
+                        return landed
+                continue
+            except Exception:
+                self.index.discard(client_id)
+                raise
+            self._acked(client_id, order, side, price)
+            return order
+
+    async def _find_order(self, client_id: str, symbol: str, params: dict):
+        """Look an order up by client id in the open, then closed, orders. None if it isn't there."""
+        fetch_params = {'stop': True} if params.get('stop') else {}
+        for fetch in (self.exchange.fetch_open_orders, self.exchange.fetch_closed_orders):
+            orders = await fetch(symbol, params=fetch_params)
+            found = self.index.reconcile(orders).get(client_id)
+            if found is not None:
+                return found
+        return None
+
+    async def _cancel_order(self, client_id: str, symbol: str, params=None):
+        """Cancel an indexed order, falling back to the client id if the exchange id is not known yet."""
+        exchange_id = self.index.exchange_id(client_id)
+        params = dict(params or {})
+        if exchange_id is None:
+            if self.exchange.id == 'bybit':
+                params['orderLinkId'] = client_id
+            elif self.exchange.id in GATE_IDS:
+                # Gate accepts the custom text in place of order_id
+                exchange_id = 't-' + client_id
+            else:
+                params['clientOrderId'] = client_id
+        try:
+            await self.exchange.cancel_order(exchange_id, symbol, params=params)
+        except ccxt.OrderNotFound:
+            # no longer on the book: nothing left to track
+            self.index.discard(client_id)
+            self.order_prices.pop(client_id, None)
+            raise
+        self.index.discard(client_id)
+        self.order_prices.pop(client_id, None)
+
+    def forget(self, client_id: str):
+        """Stop tracking an order intent entirely."""
+        for ids in (self.grid_order_ids, self.tp_order_ids):
+            if client_id in ids:
+                ids.remove(client_id)
+        self.index.discard(client_id)
+        self.order_prices.pop(client_id, None)
+        self.unmatched_ticks.pop(client_id, None)
+
+    def trigger_prices(self) -> list:
+        """Prices of live grid, TP and SL orders known locally."""
+        ids = list(self.grid_order_ids) + list(self.tp_order_ids) + [self.current_sl_order_id]
+        return [self.order_prices[cid] for cid in ids if cid in self.order_prices]
+
 
     async def place_initial_market(self):
         symbol = self.config.symbol  # futures symbol
@@ -37,19 +264,33 @@ class OrderManager:
         except Exception as e:
             logger.warning(f"Could not set leverage: {e}")
         logger.info("Leverage set to 10")
-        order = await self.exchange.create_order(
-            symbol=symbol,
-            type="market",
-            side=side,
-            amount=qty,
+        order = await self._create_order(
+            make_client_order_id(self.deal_id, 'mkt', 0),
+            symbol,
+            "market",
+            side,
+            qty,
             params={
                 "reduceOnly": False,
                 "positionSide": "SHORT" if side == "sell" else "LONG",
-            }
+            },
+            ref_price=price,
         )
         logger.info(f"Market order placed: {order}")
         return order
 
+    def record_entry_fill(self, order: dict, position: dict):
+        """Record the initial market fill from the computed entry (Bybit's create_order response
+        carries no average/filled)."""
+        side = 'sell' if self.config.side.lower() == 'short' else 'buy'
+        self.record_fill(make_client_order_id(self.deal_id, 'mkt', 0), {
+            'id': (order or {}).get('id'),
+            'side': side,
+            'average': position['entry_price'],
+            'filled': position['size'],
+            'timestamp': (order or {}).get('timestamp'),
+        })
+
     async def build_limit_grid(self, center_price: float):
         """Create a set of limit orders for averaging within the specified percent range.
         The limit_orders_amount is the total quote amount reserved for the grid.
@@ -70,7 +311,7 @@ class OrderManager:
             prices.append(price)
 
         orders = []
-        for price in prices:
+        for level, price in enumerate(prices):
             quote_each = total_quote / n
             # convert to base amount
             market = self.exchange.market(symbol)
@@ -79,13 +320,19 @@ class OrderManager:
             qty = quote_each / price / contract_size
             qty = max(qty, 0.00000001)
             logger.info(f'Creating grid limit order {side} {qty:.8f} @ {price:.2f}')
+            # tracked before sending, so an order whose outcome is unknown is still reconciled
+            cid = make_client_order_id(self.deal_id, 'grid', level)
+            self.grid_order_ids.append(cid)
             try:
-                ord = await self.exchange.create_limit_order(symbol, side, qty, price)
-                self.grid_order_ids.append(ord['id'])
+                ord = await self._create_order(cid, symbol, 'limit', side, qty, price)
                 orders.append(ord)
                 await safe_sleep(0.2)
             except Exception as e:
-                logger.exception('Failed to create grid order: %s', e)
+                if cid in self.index:
+                    logger.warning('Grid order %s outcome unknown (%s); tracking it for reconciliation', cid, e)
+                else:
+                    self.grid_order_ids.remove(cid)
+                    logger.exception('Failed to create grid order: %s', e)
         return orders
 
     async def place_tp_orders(self, pos: dict):
@@ -95,14 +342,17 @@ class OrderManager:
 
         # Cancel existing TP orders
         symbol = self.config.symbol
-        for oid in list(self.tp_order_ids):
+        for cid in list(self.tp_order_ids):
             try:
-
-                await self.exchange.cancel_order(oid, symbol)
-            except Exception:
+                await self._cancel_order(cid, symbol)
+            except ccxt.OrderNotFound:
+                # already gone -> filled
                 self.order_amount -= 1
-                pass
-        self.tp_order_ids = []
+            except Exception as e:
+                # keep it tracked so the next replacement retries the cancel
+                logger.warning('Could not cancel TP %s: %s', cid, e)
+                continue
+            self.tp_order_ids.remove(cid)
 
         side_tp = 'sell' if self.config.side.lower() == 'long' else 'buy'
         base_total = pos['size'] if pos else None
@@ -111,10 +361,14 @@ class OrderManager:
             return []
 
         created = []
+        # each replacement is a new ladder revision, so client ids never collide with cancelled TPs
+        self.tp_revision += 1
         sorted_orders = sorted(self.config.tp_orders, key=lambda o: o.price_percent)
         print(f"Filled amount: {len(sorted_orders)-self.order_amount}")
-        print(sorted_orders[-self.order_amount:])
-        for tp in sorted_orders[-self.order_amount:]:
+        print(sorted_orders[len(sorted_orders) - max(self.order_amount, 0):])
+        # levels below first_level are already filled
+        first_level = len(sorted_orders) - max(self.order_amount, 0)
+        for level, tp in enumerate(sorted_orders[first_level:], start=first_level):
 
             price = pos['entry_price'] * (1 + (tp.price_percent / 100.0) * (1 if self.config.side.lower() == 'long' else -1))
             market = self.exchange.market(symbol)
@@ -122,13 +376,18 @@ class OrderManager:
             qty = base_total * (tp.quantity_percent / 100.0) / contract_size # here
             qty = max(qty, 0.00000001)
             logger.info(f'Placing TP {side_tp} {qty:.8f} @ {price:.2f}')
+            cid = make_client_order_id(self.deal_id, f'tp{self.tp_revision}', level)
+            self.tp_order_ids.append(cid)
             try:
-                lim_order = await self.exchange.create_limit_order(symbol, side_tp, qty, price)
-                self.tp_order_ids.append(lim_order['id'])
+                lim_order = await self._create_order(cid, symbol, 'limit', side_tp, qty, price)
                 created.append(lim_order)
                 await safe_sleep(0.2)
             except Exception as e:
-                logger.exception('Failed to create TP order: %s', e)
+                if cid in self.index:
+                    logger.warning('TP order %s outcome unknown (%s); tracking it for reconciliation', cid, e)
+                else:
+                    self.tp_order_ids.remove(cid)
+                    logger.exception('Failed to create TP order: %s', e)
         return created
 
 
@@ -147,10 +406,15 @@ class OrderManager:
             # Position is no more - deleting SL if exists
             if self.current_sl_order_id:
                 try:
-                    await self.exchange.cancel_order(self.current_sl_order_id, self.config.symbol)
+                    await self._cancel_order(self.current_sl_order_id, self.config.symbol)
+                except ccxt.OrderNotFound:
+                    pass
                 except Exception as e:
                     logger.warning(f"Couldn't remove existing SL: {e}")
+                    return
             self.current_sl_order_id = None
+            self.live_sl = None
+            self.unconfirmed_sl = None
             self.trailing_active = False
             return
 
@@ -161,6 +425,9 @@ class OrderManager:
 
         ticker = await self.exchange.fetch_ticker(self.config.symbol)
         current_price = ticker["last"]
+        self.last_price = current_price
+        # local clock for every sample: the exchange timestamp isn't always present
+        self.last_price_ts = time.monotonic()
         # sl_price = base_sl_price
 
         if not self.trailing_active:
@@ -175,6 +442,10 @@ class OrderManager:
                 trailed_price = current_price * (1 + trailing_offset / 100)
                 sl_price = min(self.last_sl_price or base_sl_price, trailed_price)
 
+        sl_id = self.current_sl_order_id
+        on_book = None if self.open_client_ids is None else sl_id in self.open_client_ids
+        # the stop on the book already has this price and size -> nothing to replace
+        sl_unchanged = bool(on_book) and self.live_sl == (sl_price, size)
         # saving last SL, to not move SL back
         self.last_sl_price = sl_price
 
@@ -186,7 +457,21 @@ class OrderManager:
                     (side == "short" and current_price <= entry_price * (1 - tp1_percent / 100)):
                 self.trailing_active = True
                 logger.info("Trailing stop activated")
-        if self.exchange.id == "gate":
+        if sl_unchanged:
+            return
+        if sl_id is not None and self.live_sl is None:
+            # the last create timed out; only the open-order snapshot can tell whether it landed
+            if on_book is None:
+                return
+            if on_book:
+                self.live_sl = self.unconfirmed_sl
+                if self.live_sl == (sl_price, size):
+                    return
+            else:
+                logger.warning(f"SL {sl_id} never reached the exchange; re-sending")
+                self.index.discard(sl_id)
+                self.current_sl_order_id = None
+        if self.exchange.id in GATE_IDS:
             otype = "stop"
             side = 'sell' if side == 'long' else 'buy'
             params = {
@@ -209,23 +494,31 @@ class OrderManager:
         try:
             if self.current_sl_order_id:
                 logger.info(f"Trying to remove current SL: {self.current_sl_order_id}")
-                await self.exchange.cancel_order(self.current_sl_order_id, self.config.symbol, params=params)
+                await self._cancel_order(self.current_sl_order_id, self.config.symbol, params=params)
+        except ccxt.OrderNotFound:
+            pass
         except Exception as e:
+            # keep the old SL rather than risk two live stops; retried next tick
             logger.warning(f"Couldn't remove old SL: {e}")
+            return
+        self.current_sl_order_id = None
 
+        self.sl_revision += 1
+        cid = make_client_order_id(self.deal_id, 'sl', self.sl_revision)
         try:
-            sl_order = await self.exchange.create_order(
-                symbol=self.config.symbol,
-                type=otype,
-                side=side,
-                amount=size,
-                price=sl_price,
-                params=params
-            )
-
-            self.current_sl_order_id = sl_order["id"]
+            await self._create_order(cid, self.config.symbol, otype, side, size, sl_price, params)
+
+            self.current_sl_order_id = cid
+            self.live_sl = (sl_price, size)
+            self._record('sl_move', cid, side=side, amount=size, price=sl_price)
             logger.info(f"Stop-loss updated: {sl_price}")
         except Exception as e:
+            if cid in self.index:
+                self.current_sl_order_id = cid
+                self.live_sl = None
+                self.unconfirmed_sl = (sl_price, size)
+                logger.warning(f"SL {cid} outcome unknown ({e}); tracking it")
+                return
             raw = e.args[0] if e.args else ""
             if isinstance(raw, str) and "not modified" in raw:
                 logger.info(f"SL was not modified ({sl_price})")
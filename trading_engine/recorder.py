@@ -0,0 +1,228 @@
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+from statistics import mean
+
+from .utility import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except Exception:
+    PARQUET_AVAILABLE = False
+
+EVENT_FIELDS = [
+    ('deal_id', 'string'),
+    ('kind', 'string'),
+    ('client_order_id', 'string'),
+    ('exchange_order_id', 'string'),
+    ('ladder', 'string'),
+    ('level', 'int32'),
+    ('side', 'string'),
+    ('price', 'float64'),
+    ('amount', 'float64'),
+    ('local_ts', 'int64'),
+    ('exchange_ts', 'int64'),
+    ('info', 'string'),
+]
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class EventRecorder:
+    """Buffers trade events (orders sent, acks, fills, SL moves, exits) in memory
+    and flushes them in batches to a Parquet dataset partitioned by deal id.
+
+    Event kinds: order_sent, order_ack, fill, sl_move, exit.
+    Timestamps are epoch milliseconds; local_ts is ours, exchange_ts comes from the exchange.
+    """
+
+    def __init__(self, path: str = 'events', batch_size: int = 500, flush_interval: float = 30.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._buffer = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._pending = set()
+        if not PARQUET_AVAILABLE:
+            logger.warning('pyarrow not installed; only the latest batch of events is kept in memory')
+
+    def record(self, kind: str, deal_id: str, **fields):
+        event = {name: None for name, _ in EVENT_FIELDS}
+        event.update(fields)
+        event['kind'] = kind
+        event['deal_id'] = deal_id
+        if event['local_ts'] is None:
+            event['local_ts'] = now_ms()
+        with self._lock:
+            self._buffer.append(event)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush_in_background()
+
+    def _take(self) -> list:
+        with self._lock:
+            if not PARQUET_AVAILABLE:
+                self._buffer = self._buffer[-self.batch_size:]
+                return []
+            events, self._buffer = self._buffer, []
+            self._seq += 1
+            return events
+
+    def flush_if_due(self):
+        """Flush in the background if flush_interval has passed, so a crash loses at most that much."""
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush_in_background()
+
+    def flush_in_background(self):
+        """Hand the buffered batch to a worker thread so disk IO never blocks the event loop."""
+        self._last_flush = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        events = self._take()
+        if not events:
+            return
+        fut = loop.run_in_executor(None, self._write, events, self._seq)
+        self._pending.add(fut)
+        fut.add_done_callback(self._pending.discard)
+
+    def flush(self):
+        """Write buffered events to disk (blocking), one Parquet file per deal."""
+        self._last_flush = time.monotonic()
+        events = self._take()
+        if events:
+            self._write(events, self._seq)
+
+    async def close(self):
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        await asyncio.to_thread(self.flush)
+
+    def _write(self, events: list, seq: int):
+        by_deal = {}
+        for e in events:
+            by_deal.setdefault(e['deal_id'], []).append(e)
+        written = []
+        try:
+            for deal_id, rows in by_deal.items():
+                deal_dir = os.path.join(self.path, f'deal_id={deal_id}')
+                os.makedirs(deal_dir, exist_ok=True)
+                name = f'part-{now_ms()}-{seq}.parquet'
+                # dot-prefixed files are ignored by dataset discovery until renamed
+                tmp = os.path.join(deal_dir, '.' + name)
+                pq.write_table(pa.Table.from_pylist(rows, schema=self._file_schema()), tmp)
+                os.replace(tmp, os.path.join(deal_dir, name))
+                written.append(deal_id)
+        except Exception as e:
+            failed = [ev for ev in events if ev['deal_id'] not in written]
+            logger.exception('Failed to flush %d events: %s', len(failed), e)
+            # keep them for the next attempt
+            with self._lock:
+                self._buffer[:0] = failed
+
+    @staticmethod
+    def _file_schema():
+        # deal_id lives in the partition directory name, not in the files
+        return pa.schema([(name, getattr(pa, type_)()) for name, type_ in EVENT_FIELDS if name != 'deal_id'])
+
+    def _dataset(self, deal_id: str):
+        return ds.dataset(os.path.join(self.path, f'deal_id={deal_id}'), format='parquet',
+                          schema=self._file_schema())
+
+    def deals(self) -> list:
+        """Ids of all recorded deals (flushed and buffered)."""
+        with self._lock:
+            ids = {e['deal_id'] for e in self._buffer}
+        if PARQUET_AVAILABLE and os.path.isdir(self.path):
+            ids.update(name.split('=', 1)[1] for name in os.listdir(self.path) if name.startswith('deal_id='))
+        return sorted(ids)
+
+    def events(self, deal_id: str, kind: str = None) -> list:
+        """All events of one deal ordered by local timestamp. Only that deal's partition is read.
+        Blocking; call it off the event loop.
+        """
+        rows = []
+        if PARQUET_AVAILABLE and os.path.isdir(os.path.join(self.path, f'deal_id={deal_id}')):
+            expr = ds.field('kind') == kind if kind else None
+            rows = self._dataset(deal_id).to_table(filter=expr).to_pylist()
+            for row in rows:
+                row['deal_id'] = deal_id
+        with self._lock:
+            buffered = list(self._buffer)
+        rows += [e for e in buffered if e['deal_id'] == deal_id and (kind is None or e['kind'] == kind)]
+        rows.sort(key=lambda e: e['local_ts'] or 0)
+        return rows
+
+    def deal_report(self, deal_id: str) -> dict:
+        """Per-order ack latency, time-to-fill and slippage for one deal, plus SL move/exit summary.
+        Slippage is in basis points, positive when the fill was worse than the intended price.
+        Blocking; call it off the event loop.
+        """
+        orders = defaultdict(dict)
+        sl_moves = 0
+        exit_event = None
+        for e in self.events(deal_id):
+            kind = e['kind']
+            if kind == 'sl_move':
+                sl_moves += 1
+                continue
+            if kind == 'exit':
+                exit_event = e
+                continue
+            cid = e['client_order_id']
+            if not cid:
+                continue
+            o = orders[cid]
+            if kind == 'order_sent':
+                o.update(client_order_id=cid, ladder=e['ladder'], level=e['level'], side=e['side'],
+                         intended_price=e['price'], amount=e['amount'], sent_ts=e['local_ts'])
+            elif kind == 'order_ack':
+                o.update(exchange_order_id=e['exchange_order_id'], ack_ts=e['local_ts'])
+            elif kind == 'fill':
+                o.update(fill_price=e['price'], filled=e['amount'],
+                         fill_ts=e['exchange_ts'] or e['local_ts'])
+
+        rows = []
+        for cid, o in orders.items():
+            sent, ack, fill = o.get('sent_ts'), o.get('ack_ts'), o.get('fill_ts')
+            o['ack_latency_ms'] = ack - sent if sent and ack else None
+            o['time_to_fill_ms'] = fill - sent if sent and fill else None
+            ref, px = o.get('intended_price'), o.get('fill_price')
+            if ref and px:
+                sign = 1 if (o.get('side') or '').lower() == 'buy' else -1
+                o['slippage_bps'] = (px - ref) / ref * 10000 * sign
+            else:
+                o['slippage_bps'] = None
+            rows.append(o)
+        rows.sort(key=lambda o: o.get('sent_ts') or 0)
+
+        def _avg(key, items):
+            values = [o[key] for o in items if o.get(key) is not None]
+            return mean(values) if values else None
+
+        by_grid_level = {}
+        for o in rows:
+            if o.get('ladder') == 'grid' and o.get('time_to_fill_ms') is not None:
+                by_grid_level[o['level']] = o['time_to_fill_ms']
+
+        return {
+            'deal_id': deal_id,
+            'orders': rows,
+            'avg_ack_latency_ms': _avg('ack_latency_ms', rows),
+            'avg_slippage_bps': _avg('slippage_bps', rows),
+            'grid_time_to_fill_ms': by_grid_level,
+            'sl_moves': sl_moves,
+            'exit_reason': exit_event['info'] if exit_event else None,
+            'exit_ts': exit_event['local_ts'] if exit_event else None,
+        }
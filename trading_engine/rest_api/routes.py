@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import HTMLResponse
 
 router = APIRouter()
@@ -24,6 +24,24 @@ async def get_position(request: Request):
     engine = request.app.state.engine
     return engine.order_manager.position if engine.order_manager.position else {}
 
+@router.get("/metrics")
+async def get_metrics(request: Request):
+    engine = request.app.state.engine
+    return {"monitor": engine.scheduler.metrics()}
+
+# plain def: FastAPI runs these in its threadpool, keeping dataset scans off the event loop
+@router.get("/deals")
+def list_deals(request: Request):
+    engine = request.app.state.engine
+    return {"current": engine.order_manager.deal_id, "deals": engine.recorder.deals()}
+
+@router.get("/deals/{deal_id}/report")
+def deal_report(request: Request, deal_id: str):
+    engine = request.app.state.engine
+    if deal_id not in engine.recorder.deals():
+        raise HTTPException(status_code=404, detail=f"Unknown deal {deal_id}")
+    return engine.recorder.deal_report(deal_id)
+
 @router.post("/config/reload")
 async def reload_config(request: Request):
     engine = request.app.state.engine
@@ -0,0 +1,76 @@
+import math
+import time
+from collections import deque
+
+
+class AdaptiveScheduler:
+    """Chooses the monitor poll interval from the distance to the nearest live trigger
+    (grid, TP or SL price) and recent volatility.
+
+    Price is treated as a random walk: with per-second volatility sigma, the time for a move
+    of `safety` standard deviations to cover the relative distance d is (d / (safety * sigma))^2.
+    The result is clamped to [min_interval, max_interval].
+    """
+
+    def __init__(self, min_interval: float = 1.0, max_interval: float = 15.0, default_interval: float = 5.0,
+                 window: int = 30, safety: float = 3.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.safety = safety
+        self._samples = deque(maxlen=window)
+        self.last_interval = self._clamp(default_interval)
+        self.last_distance = None
+        self.last_volatility = None
+
+    def _clamp(self, interval: float) -> float:
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def observe(self, price: float, ts: float = None):
+        """Add a price sample (ts defaults to the monotonic clock)."""
+        if not price or price <= 0:
+            return
+        ts = time.monotonic() if ts is None else ts
+        if self._samples and ts <= self._samples[-1][0]:
+            return
+        self._samples.append((ts, price))
+
+    def volatility(self):
+        """Per-second volatility of log returns over the sample window, None until two samples exist."""
+        if len(self._samples) < 2:
+            return None
+        total = 0.0
+        samples = list(self._samples)
+        for (t0, p0), (t1, p1) in zip(samples, samples[1:]):
+            r = math.log(p1 / p0)
+            total += r * r / (t1 - t0)
+        return math.sqrt(total / (len(samples) - 1))
+
+    def next_interval(self, price: float, triggers) -> float:
+        """Interval until the next poll given the current price and live trigger prices."""
+        triggers = [t for t in triggers if t]
+        sigma = self.volatility()
+        self.last_volatility = sigma
+        if not price or not triggers:
+            self.last_distance = None
+            interval = self.max_interval if price else self.default_interval
+        else:
+            d = min(abs(price - t) for t in triggers) / price
+            self.last_distance = d
+            if sigma is None:
+                interval = self.default_interval
+            elif sigma == 0:
+                interval = self.max_interval
+            else:
+                interval = (d / (self.safety * sigma)) ** 2
+        self.last_interval = self._clamp(interval)
+        return self.last_interval
+
+    def metrics(self) -> dict:
+        return {
+            'poll_interval': self.last_interval,
+            'distance_to_trigger': self.last_distance,
+            'volatility_per_sec': self.last_volatility,
+            'min_interval': self.min_interval,
+            'max_interval': self.max_interval,
+        }